@@ -1,81 +1,146 @@
 import whois
+import atexit
+import signal
+import sys
 import time
 import os
 import json
+import hashlib
+import heapq
+import re
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
 from notifications import NotificationManager
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+try:
+    import orjson  # Optionnel: sérialisation JSON plus rapide
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger('domain_monitor')
 
+# Format des dates affichées et enregistrées
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Durée de validité du cache WHOIS (en secondes) selon la proximité de l'expiration
+WHOIS_CACHE_TTL_LONG = 10 * 86400  # Plus de 30 jours avant l'expiration
+WHOIS_CACHE_TTL_SHORT = 3 * 86400
+
+
+# Empreinte du dernier contenu écrit pour chaque fichier
+_last_written = {}
+
+
+# Conversion d'une variable d'environnement en booléen
+def _bool(value):
+    return value.strip().lower() == 'true'
+
+
+# Conversion d'une variable d'environnement en entier, avec repli sur la valeur par défaut
+def _int(name, default):
+    value = os.environ.get(name, '')
+    try:
+        return int(value)
+    except ValueError:
+        if value.strip():
+            logger.warning("Valeur invalide pour %s (%r), utilisation de %s", name, value, default)
+        return default
+
 
 # Lecture de la configuration
 def get_config():
+    # DOMAINS accepte une liste séparée par des virgules, DOMAIN reste supporté
+    domains_env = os.environ.get('DOMAINS') or os.environ.get('DOMAIN', '')
+
     config = {
-        'domain': os.environ.get('DOMAIN', ''),
+        'domains': list(dict.fromkeys(d.strip() for d in domains_env.split(',') if d.strip())),
         'check_interval': int(os.environ.get('CHECK_INTERVAL', 3600)),  # Default: 1 heure
         'history_file': os.environ.get('HISTORY_FILE', '/app/data/domain_history.json'),
+        'whois_cache_file': os.environ.get('WHOIS_CACHE_FILE', '/app/data/whois_cache.json'),
+        'whois_force_refresh': _bool(os.environ.get('WHOIS_FORCE_REFRESH', 'false')),
+        'store_raw_whois': _bool(os.environ.get('STORE_RAW_WHOIS', 'false')),
 
         # Email config
-        'email_enabled': os.environ.get('EMAIL_ENABLED', 'false'),
+        'email_enabled': _bool(os.environ.get('EMAIL_ENABLED', 'false')),
         'email_from': os.environ.get('EMAIL_FROM', ''),
         'email_to': os.environ.get('EMAIL_TO', ''),
         'smtp_server': os.environ.get('SMTP_SERVER', 'smtp.gmail.com'),
-        'smtp_port': os.environ.get('SMTP_PORT', '587'),
+        'smtp_port': _int('SMTP_PORT', 587),
         'smtp_username': os.environ.get('SMTP_USERNAME', ''),
         'smtp_password': os.environ.get('SMTP_PASSWORD', ''),
 
         # Pushover config
-        'pushover_enabled': os.environ.get('PUSHOVER_ENABLED', 'false'),
+        'pushover_enabled': _bool(os.environ.get('PUSHOVER_ENABLED', 'false')),
         'pushover_app_token': os.environ.get('PUSHOVER_APP_TOKEN', ''),
         'pushover_user_key': os.environ.get('PUSHOVER_USER_KEY', ''),
 
         # Telegram config
-        'telegram_enabled': os.environ.get('TELEGRAM_ENABLED', 'false'),
+        'telegram_enabled': _bool(os.environ.get('TELEGRAM_ENABLED', 'false')),
         'telegram_bot_token': os.environ.get('TELEGRAM_BOT_TOKEN', ''),
         'telegram_chat_id': os.environ.get('TELEGRAM_CHAT_ID', ''),
 
         # Discord config
-        'discord_enabled': os.environ.get('DISCORD_ENABLED', 'false'),
+        'discord_enabled': _bool(os.environ.get('DISCORD_ENABLED', 'false')),
         'discord_webhook_url': os.environ.get('DISCORD_WEBHOOK_URL', ''),
 
         # Ntfy config
-        'ntfy_enabled': os.environ.get('NTFY_ENABLED', 'false'),
+        'ntfy_enabled': _bool(os.environ.get('NTFY_ENABLED', 'false')),
         'ntfy_topic': os.environ.get('NTFY_TOPIC', '')
     }
 
     # Vérification des paramètres requis
-    if not config['domain']:
-        raise ValueError("Le domaine à surveiller n'est pas configuré")
+    if not config['domains']:
+        raise ValueError("Aucun domaine à surveiller n'est configuré")
+
+    # Intervalle propre à chaque domaine, ex: CHECK_INTERVAL_EXAMPLE_COM=600
+    config['check_intervals'] = {
+        domain: _int('CHECK_INTERVAL_' + re.sub(r'[^A-Z0-9]', '_', domain.upper()), config['check_interval'])
+        for domain in config['domains']
+    }
 
     return config
 
 
+# Tri des listes de chaînes pour une comparaison cohérente; les autres listes (ex: plusieurs
+# dates) sont normalisées élément par élément pour garder les mêmes types en mémoire et sur disque
+def _normalize_list(value):
+    try:
+        return sorted(map(str.lower, value))
+    except TypeError:
+        return [normalize_whois_value(item) for item in value]
+
+
+# Traitement des dates
+def _normalize_date(value):
+    return value.strftime(DATE_FORMAT)
+
+
+# Normalisation selon le type exact de la valeur, les autres types sont convertis en chaîne
+_NORMALIZERS = {
+    list: _normalize_list,
+    datetime: _normalize_date,
+    date: _normalize_date,
+    str: str,
+}
+
+
 def normalize_whois_value(value):
     if value is None:
         return None
+    return _NORMALIZERS.get(type(value), str)(value)
 
-    # Traitement des listes
-    if isinstance(value, list):
-        # Tri des listes pour une comparaison cohérente
-        if all(isinstance(x, str) for x in value):
-            return sorted([str(x).lower() for x in value])
-        return value
 
-    # Traitement des dates
-    if hasattr(value, 'strftime'):
-        return value.strftime('%Y-%m-%d %H:%M:%S')
+# Champs WHOIS conservés dans le statut du domaine
+WHOIS_FIELDS = (
+    'domain_name', 'registrar', 'whois_server', 'status',
+    'name_servers', 'creation_date', 'expiration_date',
+    'updated_date', 'dnssec'
+)
 
-    # Autres types
-    return str(value)
 
 # Fonction pour vérifier le statut du domaine
-def check_domain_status(domain):
+def check_domain_status(domain, store_raw=False):
     try:
         w = whois.whois(domain)
 
@@ -83,179 +148,369 @@ def check_domain_status(domain):
         status = {}
 
         # Vérifier si le domaine existe
-        if w.domain_name is None:
+        if w.get('domain_name') is None:
             status['registered'] = False
             status['availability'] = "Le domaine semble être disponible"
         else:
             status['registered'] = True
 
-            # Récupérer les informations importantes
-            important_fields = [
-                'domain_name', 'registrar', 'whois_server', 'status',
-                'name_servers', 'creation_date', 'expiration_date',
-                'updated_date', 'dnssec'
-            ]
+            # Récupérer les informations importantes (absentes: None)
+            for field in WHOIS_FIELDS:
+                status[field] = normalize_whois_value(w.get(field))
 
-            for field in important_fields:
-                if hasattr(w, field):
-                    status[field] = normalize_whois_value(getattr(w, field))
-
-        status['raw_text'] = w.text if hasattr(w, 'text') else "Pas de texte brut disponible"
+        # Le texte brut pèse souvent plusieurs Ko et n'est pas comparé: optionnel
+        if store_raw:
+            status['raw_text'] = getattr(w, 'text', None) or "Pas de texte brut disponible"
         status['check_time'] = datetime.now().isoformat()
 
         return status
     except Exception as e:
-        logger.error(f"Erreur lors de la vérification du domaine {domain}: {e}")
+        logger.error("Erreur lors de la vérification du domaine %s: %s", domain, e)
         return {
             'error': str(e),
             'check_time': datetime.now().isoformat()
         }
 
 
-# Fonction pour comparer les statuts et détecter les changements
-def detect_changes(previous_status, current_status):
-    changes = {}
+# Fonction pour calculer le nombre de jours avant l'expiration du domaine
+def days_to_expiry(status):
+    expiration = status.get('expiration_date')
+    if isinstance(expiration, list):
+        expiration = expiration[0] if expiration else None
+
+    if isinstance(expiration, str):
+        try:
+            expiration = datetime.strptime(expiration, DATE_FORMAT)
+        except ValueError:
+            return None
+
+    if not isinstance(expiration, datetime):
+        return None
+
+    return (expiration - datetime.now()).days
+
+
+# Fonction pour déterminer la durée de validité d'un statut en cache
+def whois_cache_ttl(status):
+    days = days_to_expiry(status)
+    if days is not None and days > 30:
+        return WHOIS_CACHE_TTL_LONG
+    return WHOIS_CACHE_TTL_SHORT
+
+
+# Fonction pour obtenir le statut du domaine et son empreinte, depuis le cache si possible
+def get_domain_status(domain, cache, force_refresh=False, store_raw=False):
+    entry = cache.get(domain)
+    now = time.time()
+
+    if not force_refresh and entry and now - entry['cached_at'] < entry['ttl']:
+        logger.info("Statut de %s récupéré depuis le cache WHOIS", domain)
+
+        # Les entrées antérieures à l'ajout des empreintes sont complétées une fois
+        if 'fingerprint' not in entry:
+            entry['fingerprint'] = fingerprint(entry['status'])
+        return entry['status'], entry['fingerprint']
+
+    status = check_domain_status(domain, store_raw)
+
+    # Les erreurs ne sont pas mises en cache pour être réessayées au prochain contrôle
+    if 'error' in status:
+        return status, None
+
+    status_fingerprint = fingerprint(status)
+    cache[domain] = {
+        'status': status,
+        'fingerprint': status_fingerprint,
+        'cached_at': now,
+        'ttl': whois_cache_ttl(status)
+    }
+
+    return status, status_fingerprint
+
+
+# Champs ignorés lors de la comparaison des statuts
+SKIP_FIELDS = frozenset({'check_time', 'raw_text'})
+
+
+# Empreinte canonique d'un statut, indépendante de l'ordre des clés
+def fingerprint(status):
+    payload = _dumps({k: v for k, v in status.items() if k not in SKIP_FIELDS}, sort_keys=True)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
+
+# Fonction pour comparer les statuts et détecter les changements
+def detect_changes(previous_status, current_status, previous_fingerprint=None, current_fingerprint=None):
     if 'error' in current_status:
         return {"error": current_status['error']}
 
     if not previous_status:
         return {"message": "Premier contrôle, pas d'historique disponible"}
 
-    # Ignorer certains champs dans la comparaison
-    skip_fields = ['check_time', 'raw_text']
-
-    for key in current_status:
-        if key in skip_fields:
-            continue
-
-        if key not in previous_status:
-            changes[key] = {
-                'from': None,
-                'to': current_status[key]
-            }
-        elif previous_status[key] != current_status[key]:
-            changes[key] = {
-                'from': previous_status[key],
-                'to': current_status[key]
-            }
-
-    # Vérifier les champs disparus
-    for key in previous_status:
-        if key in skip_fields:
-            continue
-
-        if key not in current_status:
-            changes[key] = {
-                'from': previous_status[key],
-                'to': None
-            }
+    # Cas le plus fréquent: empreintes déjà calculées et identiques, pas de comparaison champ par champ
+    if previous_fingerprint is not None and previous_fingerprint == current_fingerprint:
+        return {}
+
+    current_keys = current_status.keys() - SKIP_FIELDS
+    previous_keys = previous_status.keys() - SKIP_FIELDS
+
+    # Champs apparus ou modifiés, puis disparus, dans l'ordre des statuts
+    changes = {
+        key: {'from': previous_status.get(key), 'to': current_status[key]}
+        for key in current_status
+        if key in current_keys and (key not in previous_keys or previous_status[key] != current_status[key])
+    }
+    removed_keys = previous_keys - current_keys
+    changes.update(
+        {key: {'from': previous_status[key], 'to': None} for key in previous_status if key in removed_keys}
+    )
 
     return changes
 
-# Fonction pour sauvegarder l'historique
-def save_history(config, status):
-    try:
-        # Créer le répertoire de données si nécessaire
-        os.makedirs(os.path.dirname(config['history_file']), exist_ok=True)
+# Sérialisation JSON compacte, via orjson si disponible
+def _dumps(data, sort_keys=False):
+    if orjson is not None:
+        # Les dates passent aussi par str() pour produire les mêmes octets que json
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=str, option=option)
+    return json.dumps(
+        data, separators=(',', ':'), sort_keys=sort_keys, default=str, ensure_ascii=False
+    ).encode('utf-8')
+
+
+# Écriture atomique d'un fichier JSON, ignorée si le contenu n'a pas changé
+def write_json_atomic(path, data):
+    payload = _dumps(data)
+    digest = hashlib.blake2b(payload, digest_size=16).digest()
+    if _last_written.get(path) == digest:
+        return False
+
+    # Créer le répertoire de données si nécessaire
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Un arrêt pendant l'écriture ne peut pas corrompre le fichier existant
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+    _last_written[path] = digest
+    return True
+
 
-        with open(config['history_file'], 'w') as f:
-            json.dump(status, f, indent=2)
-        logger.info(f"Historique sauvegardé dans {config['history_file']}")
+# Fonction pour sauvegarder l'historique (indexé par domaine)
+def save_history(config, history):
+    try:
+        if write_json_atomic(config['history_file'], history):
+            logger.info("Historique sauvegardé dans %s", config['history_file'])
         return True
     except Exception as e:
-        logger.error(f"Erreur lors de la sauvegarde de l'historique: {e}")
+        logger.error("Erreur lors de la sauvegarde de l'historique: %s", e)
         return False
 
 
+# Fonction pour retrouver le domaine d'un historique à l'ancien format
+def legacy_history_domain(domains, status):
+    names = status.get('domain_name')
+    if isinstance(names, str):
+        names = [names]
+    names = {str(name).lower() for name in names or ()}
+
+    for domain in domains:
+        if domain.lower() in names:
+            return domain
+    return domains[0]
+
+
 # Fonction pour charger l'historique
 def load_history(config):
     try:
         if os.path.exists(config['history_file']):
-            with open(config['history_file'], 'r') as f:
+            with open(config['history_file'], 'r', encoding='utf-8') as f:
+                history = json.load(f)
+
+            # Ancien format: un seul statut pour un seul domaine
+            if 'check_time' in history:
+                return {legacy_history_domain(config['domains'], history): history}
+            return history
+        return {}
+    except Exception as e:
+        logger.error("Erreur lors du chargement de l'historique: %s", e)
+        return {}
+
+# Fonction pour sauvegarder le cache WHOIS
+def save_whois_cache(config, cache):
+    try:
+        write_json_atomic(config['whois_cache_file'], cache)
+        return True
+    except Exception as e:
+        logger.error("Erreur lors de la sauvegarde du cache WHOIS: %s", e)
+        return False
+
+
+# Fonction pour charger le cache WHOIS
+def load_whois_cache(config):
+    try:
+        if os.path.exists(config['whois_cache_file']):
+            with open(config['whois_cache_file'], 'r', encoding='utf-8') as f:
                 return json.load(f)
-        return None
+        return {}
     except Exception as e:
-        logger.error(f"Erreur lors du chargement de l'historique: {e}")
-        return None
+        logger.error("Erreur lors du chargement du cache WHOIS: %s", e)
+        return {}
+
 
 # Fonction pour préparer le message de notification
 def prepare_notification_message(domain, changes, current_status):
     subject = f"Changement détecté pour le domaine {domain}"
 
-    # Corps du message
-    body = f"Changements détectés pour {domain} le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}:\n\n"
+    # Corps du message, assemblé en une seule fois
+    now = datetime.now().strftime(DATE_FORMAT)
+    parts = [f"Changements détectés pour {domain} le {now}:", ""]
 
     for key, change in changes.items():
-        body += f"{key}:\n"
-        body += f"  - Avant: {change['from']}\n"
-        body += f"  - Après: {change['to']}\n\n"
+        parts.append(f"{key}:\n  - Avant: {change['from']}\n  - Après: {change['to']}")
+        parts.append("")
 
-    body += "\nStatut actuel du domaine:\n"
+    parts.append("")
+    parts.append("Statut actuel du domaine:")
 
     # Afficher d'abord les champs les plus importants
     important_fields = ['registered', 'domain_name', 'registrar', 'expiration_date', 'status']
-    for key in important_fields:
-        if key in current_status:
-            body += f"{key}: {current_status[key]}\n"
+    parts.extend(f"{key}: {current_status[key]}" for key in important_fields if key in current_status)
+    parts.append("")
 
-    return subject, body
+    return subject, "\n".join(parts)
 
 
-# Fonction principale
-def main():
-    try:
-        config = get_config()
-        logger.info(f"Démarrage de la surveillance du domaine {config['domain']}")
+# Fonction pour traiter le résultat d'une vérification
+def process_domain_status(notification_manager, domain, previous_status, current_status,
+                          previous_fingerprint=None, current_fingerprint=None):
+    # Détecter les changements
+    changes = detect_changes(previous_status, current_status, previous_fingerprint, current_fingerprint)
 
-        # Initialiser le gestionnaire de notifications
-        notification_manager = NotificationManager(config)
+    # Si des changements sont détectés, envoyer une notification
+    if changes and len(changes) > 0 and not (len(changes) == 1 and "message" in changes):
+        # json.dumps est coûteux, ne l'appeler que si le message sera émis
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Changements détectés pour %s: %s",
+                domain, json.dumps(changes, indent=2, default=str, ensure_ascii=False)
+            )
 
-        while True:
-            logger.info(f"Vérification du statut de {config['domain']}")
+        # Préparer le message de notification
+        subject, message = prepare_notification_message(domain, changes, current_status)
 
-            # Charger l'historique
-            previous_status = load_history(config)
+        # Envoyer les notifications via tous les canaux configurés
+        results = notification_manager.send_notification(subject, message, changes, current_status)
 
-            # Vérifier le statut actuel
-            current_status = check_domain_status(config['domain'])
+        # Afficher les résultats
+        for service, success in results:
+            status = "succès" if success else "échec"
+            logger.info("Notification via %s: %s", service, status)
+    else:
+        logger.info("Aucun changement détecté pour %s", domain)
 
-            # Détecter les changements
-            changes = detect_changes(previous_status, current_status)
-
-            # Si des changements sont détectés, envoyer une notification
-            if changes and len(changes) > 0 and not (len(changes) == 1 and "message" in changes):
-                logger.info(f"Changements détectés: {json.dumps(changes, indent=2)}")
-
-                # Préparer le message de notification
-                subject, message = prepare_notification_message(config['domain'], changes, current_status)
-
-                # Envoyer les notifications via tous les canaux configurés
-                results = notification_manager.send_notification(subject, message, changes, current_status)
+    return changes
 
-                # Afficher les résultats
-                for service, success in results:
-                    status = "succès" if success else "échec"
-                    logger.info(f"Notification via {service}: {status}")
-            else:
-                logger.info("Aucun changement détecté")
 
-            # Sauvegarder l'historique
-            save_history(config, current_status)
+# Fonction principale
+def main():
+    notification_manager = None
+    try:
+        config = get_config()
+        domains = config['domains']
+        logger.info("Démarrage de la surveillance des domaines: %s", ', '.join(domains))
 
-            # Attendre avant la prochaine vérification
-            next_check = datetime.now().timestamp() + config['check_interval']
-            next_check_time = datetime.fromtimestamp(next_check).strftime('%Y-%m-%d %H:%M:%S')
-            logger.info(f"Prochaine vérification prévue à {next_check_time}")
+        # Initialiser le gestionnaire de notifications
+        notification_manager = NotificationManager(config)
 
-            time.sleep(config['check_interval'])
+        # Charger le cache WHOIS, partagé entre les redémarrages
+        whois_cache = load_whois_cache(config)
+        force_refresh = config['whois_force_refresh']
+
+        # L'historique est chargé une seule fois puis conservé en mémoire,
+        # avec l'empreinte de chaque statut calculée une seule fois
+        history = load_history(config)
+        fingerprints = {domain: fingerprint(status) for domain, status in history.items()}
+        atexit.register(save_history, config, history)
+        atexit.register(save_whois_cache, config, whois_cache)
+
+        # docker stop envoie SIGTERM: sortir proprement pour exécuter les handlers atexit
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        # File de priorité des prochaines vérifications: (échéance monotone, domaine)
+        schedule = [(time.monotonic(), domain) for domain in domains]
+        heapq.heapify(schedule)
+
+        # Les requêtes WHOIS sont limitées par le réseau, on les parallélise
+        with ThreadPoolExecutor(max_workers=min(32, len(domains))) as executor:
+            while True:
+                # Récupérer tous les domaines arrivés à échéance
+                now = time.monotonic()
+                due = []
+                while schedule and schedule[0][0] <= now:
+                    due.append(heapq.heappop(schedule))
+
+                if due:
+                    logger.info("Vérification du statut de %s domaine(s)", len(due))
+
+                    # Vérifier le statut actuel des domaines en parallèle
+                    futures = {
+                        executor.submit(
+                            get_domain_status, domain, whois_cache, force_refresh, config['store_raw_whois']
+                        ): domain
+                        for _, domain in due
+                    }
+
+                    history_changed = False
+                    for future in as_completed(futures):
+                        domain = futures[future]
+                        current_status, current_fingerprint = future.result()
+
+                        # Premier contrôle, erreur ou changement: l'historique doit être persisté
+                        if process_domain_status(notification_manager, domain, history.get(domain), current_status,
+                                                 fingerprints.get(domain), current_fingerprint):
+                            history_changed = True
+                        history[domain] = current_status
+                        fingerprints[domain] = current_fingerprint
+
+                    # Sauvegarder l'historique uniquement s'il a changé
+                    if history_changed:
+                        save_history(config, history)
+                    save_whois_cache(config, whois_cache)
+
+                    # Replanifier à partir de l'échéance prévue pour éviter toute dérive,
+                    # sans rattraper les cycles manqués si la vérification a débordé
+                    now = time.monotonic()
+                    for due_ts, domain in due:
+                        next_ts = max(due_ts + config['check_intervals'][domain], now)
+                        heapq.heappush(schedule, (next_ts, domain))
+
+                # Attendre avant la prochaine vérification
+                sleep_for = max(0, schedule[0][0] - time.monotonic())
+                next_check_time = (datetime.now() + timedelta(seconds=sleep_for)).strftime(DATE_FORMAT)
+                logger.info("Prochaine vérification de %s prévue à %s", schedule[0][1], next_check_time)
+
+                time.sleep(sleep_for)
 
     except KeyboardInterrupt:
         logger.info("Interruption manuelle, arrêt du bot")
     except Exception as e:
-        logger.error(f"Erreur dans la fonction principale: {e}")
+        logger.error("Erreur dans la fonction principale: %s", e)
         raise
+    finally:
+        if notification_manager is not None:
+            notification_manager.close()
 
 
 if __name__ == "__main__":
+    # Configuration du logging, uniquement lorsque le script est exécuté directement
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     main()
@@ -1,67 +1,141 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import logging
 import smtplib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 logger = logging.getLogger('domain_monitor')
 
+# Timeouts HTTP (connexion, lecture) en secondes
+HTTP_TIMEOUT = (3.05, 10)
+
+# Nouvelles tentatives avec backoff exponentiel sur les erreurs transitoires
+HTTP_RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=('POST',),
+    raise_on_status=False  # Laisser chaque service journaliser la dernière réponse
+)
+
 
 class NotificationManager:
     def __init__(self, config):
         self.config = config
         self.notification_services = []
 
+        # Session HTTP partagée pour réutiliser les connexions TCP/TLS
+        self.session = requests.Session()
+        self.session.mount(
+            'https://',
+            HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=HTTP_RETRY)
+        )
+
         # Configurer les services activés
-        if config.get('email_enabled', 'false').lower() == 'true':
+        if config.get('email_enabled'):
             self.notification_services.append(EmailNotifier(config))
 
-        if config.get('pushover_enabled', 'false').lower() == 'true':
-            self.notification_services.append(PushoverNotifier(config))
+        if config.get('pushover_enabled'):
+            self.notification_services.append(PushoverNotifier(config, self.session))
 
-        if config.get('telegram_enabled', 'false').lower() == 'true':
-            self.notification_services.append(TelegramNotifier(config))
+        if config.get('telegram_enabled'):
+            self.notification_services.append(TelegramNotifier(config, self.session))
 
-        if config.get('discord_enabled', 'false').lower() == 'true':
-            self.notification_services.append(DiscordNotifier(config))
+        if config.get('discord_enabled'):
+            self.notification_services.append(DiscordNotifier(config, self.session))
 
-        if config.get('ntfy_enabled', 'false').lower() == 'true':
-            self.notification_services.append(NtfyNotifier(config))
+        if config.get('ntfy_enabled'):
+            self.notification_services.append(NtfyNotifier(config, self.session))
 
         if not self.notification_services:
             logger.warning("Aucun service de notification n'est activé!")
 
     def send_notification(self, subject, message, changes, current_status):
-        """Envoie une notification à tous les services configurés"""
-        results = []
+        """Envoie une notification à tous les services configurés, en parallèle"""
+        if not self.notification_services:
+            return []
+
+        results = {}
+
+        # Tronquer le message une seule fois par longueur maximale requise
+        truncated = {
+            max_len: message[:max_len]
+            for max_len in {service.max_len for service in self.notification_services}
+        }
+
+        with ThreadPoolExecutor(max_workers=len(self.notification_services)) as executor:
+            futures = {
+                executor.submit(service.send, subject, truncated[service.max_len], changes, current_status): service
+                for service in self.notification_services
+            }
 
+            for future in as_completed(futures):
+                service = futures[future]
+                try:
+                    success = future.result()
+                    results[service] = success
+                    if success:
+                        logger.info("Notification envoyée via %s", service.__class__.__name__)
+                    else:
+                        logger.warning("Échec de l'envoi via %s", service.__class__.__name__)
+                except Exception as e:
+                    logger.error("Erreur lors de l'envoi via %s: %s", service.__class__.__name__, e)
+                    results[service] = False
+
+        # Conserver l'ordre de configuration des services
+        return [(service.__class__.__name__, results[service]) for service in self.notification_services]
+
+    def close(self):
+        """Ferme les connexions ouvertes par les services de notification"""
         for service in self.notification_services:
-            try:
-                success = service.send(subject, message, changes, current_status)
-                results.append((service.__class__.__name__, success))
-                if success:
-                    logger.info(f"Notification envoyée via {service.__class__.__name__}")
-                else:
-                    logger.warning(f"Échec de l'envoi via {service.__class__.__name__}")
-            except Exception as e:
-                logger.error(f"Erreur lors de l'envoi via {service.__class__.__name__}: {e}")
-                results.append((service.__class__.__name__, False))
+            if isinstance(service, EmailNotifier):
+                service.close()
 
-        return results
+        self.session.close()
 
 
 class EmailNotifier:
     """Service de notification par email"""
 
-    def __init__(self, config):
+    REQUIRED = ('email_from', 'email_to', 'smtp_server', 'smtp_port', 'smtp_username', 'smtp_password')
+
+    def __init__(self, config, max_len=None):
         self.config = config
+        self.max_len = max_len  # Pas de limite par défaut
+        self.port = config.get('smtp_port')
+        self._smtp = None
 
         # Validation des paramètres requis
-        required = ['email_from', 'email_to', 'smtp_server', 'smtp_port', 'smtp_username', 'smtp_password']
-        for param in required:
-            if not config.get(param):
-                logger.warning(f"EmailNotifier: Paramètre manquant: {param}")
+        missing = [param for param in self.REQUIRED if not config.get(param)]
+        if missing:
+            logger.warning("EmailNotifier: Paramètres manquants: %s", ', '.join(missing))
+
+    def _connect(self):
+        """Ouvre une nouvelle connexion SMTP authentifiée"""
+        self.close()
+
+        server = smtplib.SMTP(self.config['smtp_server'], self.port)
+        server.starttls()
+        server.login(self.config['smtp_username'], self.config['smtp_password'])
+        self._smtp = server
+
+    def _ensure_connected(self):
+        """Vérifie que la connexion est toujours active, sinon la rétablit"""
+        if self._smtp is None:
+            self._connect()
+            return
+
+        try:
+            code, _ = self._smtp.noop()
+        except (smtplib.SMTPException, OSError):
+            code = None
+
+        if code != 250:
+            self._connect()
 
     def send(self, subject, message, changes, current_status):
         try:
@@ -72,28 +146,51 @@ class EmailNotifier:
 
             msg.attach(MIMEText(message, 'plain'))
 
-            server = smtplib.SMTP(self.config['smtp_server'], int(self.config['smtp_port']))
-            server.starttls()
-            server.login(self.config['smtp_username'], self.config['smtp_password'])
-            server.send_message(msg)
-            server.quit()
+            self._ensure_connected()
+            try:
+                self._smtp.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Le serveur a pu fermer la connexion entre le NOOP et l'envoi
+                self._connect()
+                self._smtp.send_message(msg)
 
             return True
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi de l'email: {e}")
+            logger.error("Erreur lors de l'envoi de l'email: %s", e)
+            self.close()
             return False
 
+    def close(self):
+        """Ferme la connexion SMTP persistante"""
+        if self._smtp is None:
+            return
+
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self._smtp = None
+
+    def __del__(self):
+        self.close()
+
 
 class PushoverNotifier:
     """Service de notification via Pushover"""
 
-    def __init__(self, config):
+    REQUIRED = ('pushover_app_token', 'pushover_user_key')
+    API_URL = "https://api.pushover.net/1/messages.json"
+
+    def __init__(self, config, session, max_len=1024):
         self.config = config
-        self.api_url = "https://api.pushover.net/1/messages.json"
+        self.session = session
+        self.max_len = max_len  # Limite de l'API: 1024 caractères
 
         # Validation des paramètres requis
-        if not config.get('pushover_app_token') or not config.get('pushover_user_key'):
-            logger.warning("PushoverNotifier: Token d'application ou clé utilisateur manquant")
+        missing = [param for param in self.REQUIRED if not config.get(param)]
+        if missing:
+            logger.warning("PushoverNotifier: Paramètres manquants: %s", ', '.join(missing))
 
     def send(self, subject, message, changes, current_status):
         try:
@@ -101,33 +198,39 @@ class PushoverNotifier:
                 "token": self.config['pushover_app_token'],
                 "user": self.config['pushover_user_key'],
                 "title": subject,
-                "message": message[:1024],  # Limité à 1024 caractères
+                "message": message,
                 "priority": 1  # 1 = Haute priorité
             }
 
-            response = requests.post(self.api_url, data=payload)
+            response = self.session.post(self.API_URL, data=payload, timeout=HTTP_TIMEOUT)
             if response.status_code == 200:
                 return True
             else:
-                logger.error(f"Erreur Pushover: {response.text}")
+                logger.error("Erreur Pushover: %s", response.text)
                 return False
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi Pushover: {e}")
+            logger.error("Erreur lors de l'envoi Pushover: %s", e)
             return False
 
 
 class TelegramNotifier:
     """Service de notification via Telegram"""
 
-    def __init__(self, config):
+    REQUIRED = ('telegram_bot_token', 'telegram_chat_id')
+    API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+
+    def __init__(self, config, session, max_len=4096):
         self.config = config
+        self.session = session
+        self.max_len = max_len  # Limite de l'API: 4096 caractères
         self.bot_token = config.get('telegram_bot_token', '')
         self.chat_id = config.get('telegram_chat_id', '')
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        self.api_url = self.API_URL.format(token=self.bot_token)
 
         # Validation des paramètres requis
-        if not self.bot_token or not self.chat_id:
-            logger.warning("TelegramNotifier: Token de bot ou ID de chat manquant")
+        missing = [param for param in self.REQUIRED if not config.get(param)]
+        if missing:
+            logger.warning("TelegramNotifier: Paramètres manquants: %s", ', '.join(missing))
 
     def send(self, subject, message, changes, current_status):
         try:
@@ -136,38 +239,43 @@ class TelegramNotifier:
 
             payload = {
                 "chat_id": self.chat_id,
-                "text": text[:4096],  # Limité à 4096 caractères
+                "text": text[:self.max_len],  # Le titre s'ajoute au message déjà tronqué
                 "parse_mode": "Markdown"
             }
 
-            response = requests.post(self.api_url, data=payload)
+            response = self.session.post(self.api_url, data=payload, timeout=HTTP_TIMEOUT)
             if response.status_code == 200:
                 return True
             else:
-                logger.error(f"Erreur Telegram: {response.text}")
+                logger.error("Erreur Telegram: %s", response.text)
                 return False
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi Telegram: {e}")
+            logger.error("Erreur lors de l'envoi Telegram: %s", e)
             return False
 
 
 class DiscordNotifier:
     """Service de notification via Discord webhook"""
 
-    def __init__(self, config):
+    REQUIRED = ('discord_webhook_url',)
+
+    def __init__(self, config, session, max_len=2000):
         self.config = config
+        self.session = session
+        self.max_len = max_len  # Limite de l'API: 2000 caractères
         self.webhook_url = config.get('discord_webhook_url', '')
 
         # Validation des paramètres requis
-        if not self.webhook_url:
-            logger.warning("DiscordNotifier: URL de webhook manquante")
+        missing = [param for param in self.REQUIRED if not config.get(param)]
+        if missing:
+            logger.warning("DiscordNotifier: Paramètres manquants: %s", ', '.join(missing))
 
     def send(self, subject, message, changes, current_status):
         try:
-            # Formater le message pour Discord (limité à 2000 caractères)
+            # Formater le message pour Discord
             embed = {
                 "title": subject,
-                "description": message[:2000],
+                "description": message,
                 "color": 16711680  # Rouge (pour attirer l'attention)
             }
 
@@ -176,48 +284,56 @@ class DiscordNotifier:
                 "username": "Domain Monitor Bot"
             }
 
-            response = requests.post(self.webhook_url, json=payload)
+            response = self.session.post(self.webhook_url, json=payload, timeout=HTTP_TIMEOUT)
             if response.status_code == 204:  # Discord renvoie 204 pour succès
                 return True
             else:
-                logger.error(f"Erreur Discord: {response.status_code}, {response.text}")
+                logger.error("Erreur Discord: %s, %s", response.status_code, response.text)
                 return False
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi Discord: {e}")
+            logger.error("Erreur lors de l'envoi Discord: %s", e)
             return False
 
 
 class NtfyNotifier:
     """Service de notification via ntfy.sh"""
 
-    def __init__(self, config):
+    REQUIRED = ('ntfy_topic',)
+    API_URL = "https://ntfy.sh/{topic}"
+
+    def __init__(self, config, session, max_len=4096):
         self.config = config
+        self.session = session
+        self.max_len = max_len  # Limite de l'API: 4096 caractères
         self.topic = config.get('ntfy_topic', '')
-        self.api_url = f"https://ntfy.sh/{self.topic}"
+        self.api_url = self.API_URL.format(topic=self.topic)
 
         # Validation des paramètres requis
-        if not self.topic:
-            logger.warning("NtfyNotifier: Topic manquant")
+        missing = [param for param in self.REQUIRED if not config.get(param)]
+        if missing:
+            logger.warning("NtfyNotifier: Paramètres manquants: %s", ', '.join(missing))
 
     def send(self, subject, message, changes, current_status):
         try:
             headers = {
                 "Title": subject,
                 "Priority": "urgent",
-                "Tags": "warning,domain"
+                "Tags": "warning,domain",
+                "Connection": "keep-alive"
             }
 
-            response = requests.post(
+            response = self.session.post(
                 self.api_url,
-                data=message[:4096],  # Limité à 4096 caractères
-                headers=headers
+                data=message,
+                headers=headers,
+                timeout=HTTP_TIMEOUT
             )
 
             if response.status_code == 200:
                 return True
             else:
-                logger.error(f"Erreur ntfy: {response.status_code}, {response.text}")
+                logger.error("Erreur ntfy: %s, %s", response.status_code, response.text)
                 return False
         except Exception as e:
-            logger.error(f"Erreur lors de l'envoi ntfy: {e}")
+            logger.error("Erreur lors de l'envoi ntfy: %s", e)
             return False
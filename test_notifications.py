@@ -7,11 +7,6 @@ from datetime import datetime
 from notifications import NotificationManager
 from domain_monitor import get_config
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('notification_test')
 
 
@@ -75,13 +70,13 @@ def run_notification_test(services=None):
 
         # Charger la configuration
         config = get_config()
-        domain = config.get('domain', 'example.com')
+        domain = config['domains'][0] if config.get('domains') else 'example.com'
 
         # Si des services spécifiques sont demandés, les activer temporairement
         if services:
             for service in services:
-                config[f"{service}_enabled"] = "true"
-                logger.info(f"Service {service} activé pour ce test")
+                config[f"{service}_enabled"] = True
+                logger.info("Service %s activé pour ce test", service)
 
         # Initialiser le gestionnaire de notifications
         notification_manager = NotificationManager(config)
@@ -120,23 +115,29 @@ Ce message est uniquement un TEST. Aucun changement réel n'a été détecté su
         success_count = 0
         for service, success in results:
             status = "✅ SUCCÈS" if success else "❌ ÉCHEC"
-            logger.info(f"{status} - Notification via {service}")
+            logger.info("%s - Notification via %s", status, service)
             if success:
                 success_count += 1
 
         if success_count > 0:
-            logger.info(f"✅ Test réussi! {success_count}/{len(results)} notifications envoyées avec succès.")
+            logger.info("✅ Test réussi! %s/%s notifications envoyées avec succès.", success_count, len(results))
             return True
         else:
             logger.error("❌ Test échoué! Aucune notification n'a pu être envoyée.")
             return False
 
     except Exception as e:
-        logger.error(f"❌ Erreur lors du test: {e}")
+        logger.error("❌ Erreur lors du test: %s", e)
         return False
 
 
 if __name__ == "__main__":
+    # Configuration du logging, uniquement lorsque le script est exécuté directement
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
     parser = argparse.ArgumentParser(description='Test des services de notification')
     parser.add_argument('--service', '-s', action='append',
                         choices=['email', 'pushover', 'telegram', 'discord', 'ntfy'],